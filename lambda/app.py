@@ -1,11 +1,42 @@
 """AWS Lambda function for converting of Telegram channel to RSS feed."""
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import base64
+import gzip
+import json
 import os
+import threading
+import time
 
 import requests
 
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from rfeed import Feed, Item
+from selectolax.lexbor import LexborHTMLParser
+
+__all__ = ["lambda_handler", "get_rss_feed", "get_rss_feeds"]
+
+SEL_TITLE = "title"
+SEL_DESCRIPTION = "meta[content][property='og:description']"
+SEL_BUBBLE = "div.tgme_widget_message_bubble"
+SEL_LINK = "a.tgme_widget_message_date[href]"
+SEL_TEXT = "div.tgme_widget_message_text"
+SEL_TIME = "time.time[datetime]"
+
+# Number of channels fetched concurrently when several are requested at once.
+MAX_WORKERS = 8
+# Limit of channels in one request, to stay within the function timeout and response size.
+MAX_CHANNELS = 10
+
+# Kept at module scope so warm invocations reuse the open connection to Telegram.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS))
+
+# Rendered feeds by channel name, reused by warm invocations until they expire.
+FEED_CACHE = {}
+FEED_CACHE_TTL = 60
+FEED_CACHE_SIZE = 32
+FEED_CACHE_LOCK = threading.Lock()
 
 
 def lambda_handler(event, _):
@@ -17,14 +48,36 @@ def lambda_handler(event, _):
         }
 
     try:
-        return {
+        names = event["pathParameters"]["channel_name"].split(",")
+        channel_names = list(dict.fromkeys(name for name in names if name))
+        if not channel_names:
+            raise Exception("Telegram channel name is missing")
+        if len(channel_names) > MAX_CHANNELS:
+            raise Exception(f"Up to {MAX_CHANNELS} Telegram channels can be requested at once")
+
+        if len(channel_names) > 1:
+            body = json.dumps(get_rss_feeds(channel_names))
+            content_type = "application/json;charset=UTF-8"
+        else:
+            body = get_cached_rss_feed(channel_names[0])
+            content_type = "text/xml;charset=UTF-8"
+
+        response = {
             "statusCode": 200,
-            "body": get_rss_feed(event["pathParameters"]["channel_name"]),
+            "body": body,
             "headers": {
-                "Content-Type": "text/xml;charset=UTF-8",
+                "Content-Type": content_type,
                 "Cache-Control": " Max-age=0, no-cache, no-store, must-revalidate",
+                "Vary": "Accept-Encoding",
             },
         }
+        if accepts_gzip(event):
+            compressed = gzip.compress(body.encode("utf-8"), compresslevel=1)
+            response["body"] = base64.b64encode(compressed).decode("ascii")
+            response["isBase64Encoded"] = True
+            response["headers"]["Content-Encoding"] = "gzip"
+
+        return response
     except Exception as ex:
         return {
             "statusCode": 400,
@@ -32,49 +85,105 @@ def lambda_handler(event, _):
         }
 
 
+def accepts_gzip(event):
+    """Check whether the client accepts gzip-encoded response."""
+    headers = event.get("headers") or {}
+    accept_encoding = next((v or "" for k, v in headers.items() if k.lower() == "accept-encoding"), "")
+    for coding in accept_encoding.split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        if name.lower() != "gzip":
+            continue
+
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+
+    return False
+
+
+def get_rss_feeds(channel_names):
+    """Get RSS XML of several Telegram channels, fetched concurrently, mapped by channel name."""
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(channel_names))) as executor:
+        futures = {name: executor.submit(get_cached_rss_feed, name) for name in channel_names}
+
+    feeds = {}
+    for name, future in futures.items():
+        try:
+            feeds[name] = future.result()
+        except Exception as ex:
+            raise Exception(f"{name}: {ex}") from ex
+    return feeds
+
+
+def get_cached_rss_feed(channel_name):
+    """Get RSS XML of the Telegram channel, building it only if the cached one has expired."""
+    now = time.monotonic()
+    cached = FEED_CACHE.get(channel_name)
+    if cached and now - cached[0] < FEED_CACHE_TTL:
+        return cached[1]
+
+    rss = get_rss_feed(channel_name)
+    with FEED_CACHE_LOCK:
+        FEED_CACHE.pop(channel_name, None)
+        if len(FEED_CACHE) >= FEED_CACHE_SIZE:
+            del FEED_CACHE[next(iter(FEED_CACHE))]
+        FEED_CACHE[channel_name] = (now, rss)
+    return rss
+
+
 def get_rss_feed(channel_name):
     """Build RSS XML from the Telegram channel."""
     url = f"https://t.me/s/{channel_name}"
-    doc = get_doc(url)
+    title, description, bubbles = get_doc(url)
     feed = Feed(
-        title=doc.title.text,
+        title=title,
         link=url,
-        description=doc.select("meta[content][property='og:description']")[0].attrs["content"],
+        description=description,
         lastBuildDate=datetime.now(),
-        items=[Item(**get_item(d)) for d in doc.select("div[class~='tgme_widget_message_bubble']")],
+        items=[Item(**get_item(d)) for d in bubbles],
     )
     return feed.rss()
 
 
 def get_doc(url):
-    """Build RSS XML from the Telegram channel."""
-    res = requests.get(url, allow_redirects=False)
+    """Get title, description and post bubbles of the Telegram channel page."""
+    res = SESSION.get(url, allow_redirects=False)
     if res.status_code != 200:
         raise Exception("Telegram channel not found")
 
-    return BeautifulSoup(res.content, "lxml")
+    doc = LexborHTMLParser(res.content)
+    head = doc.head
+    return (
+        head.css_first(SEL_TITLE).text(),
+        head.css_first(SEL_DESCRIPTION).attributes["content"],
+        doc.body.css(SEL_BUBBLE),
+    )
 
 
 def get_item(div):
     """Create RSS feed item from the Telegram post."""
+    link = get_link(div)
+    text = get_text(div)
     return {
-        "link": get_link(div),
-        "title": get_text(div, 80),
-        "description": get_text(div),
-        "pubDate": datetime.fromisoformat(div.select("time[class='time']")[0].attrs["datetime"]),
+        "link": link,
+        "title": text[0:80] + "..." if text else link,
+        "description": text or link,
+        "pubDate": datetime.fromisoformat(div.css_first(SEL_TIME).attributes["datetime"]),
     }
 
 
 def get_link(div):
     """Get link to the Telegram post."""
-    return div.select("a[href][class='tgme_widget_message_date']")[0].attrs["href"].replace("t.me", "t.me/s")
-
+    return div.css_first(SEL_LINK).attributes["href"].replace("t.me", "t.me/s")
 
-def get_text(div, cut_to=0):
-    """Get content of the Telegram post."""
-    elements = div.select("div[class~='tgme_widget_message_text']")
-    if elements:
-        text = elements[0].get_text(separator=" ")
-        return text if cut_to == 0 else text[0:cut_to] + "..."
 
-    return get_link(div)
+def get_text(div):
+    """Get content of the Telegram post, or an empty string if the post has no text."""
+    element = div.css_first(SEL_TEXT)
+    return element.text(separator=" ", strip=True) if element is not None else ""